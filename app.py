@@ -2,15 +2,63 @@
 import os
 import sys
 import argparse
-from typing import List
-from pdf_utils import pdf_pages_text, pdf_to_images
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, BinaryIO
+from pdf_utils import pdf_pages_text, pdf_render_pages, OCR_DPI
 from ocr_utils import image_to_text
-from chunking import chunk_page_text
-from embeddings_index import EmbeddingsIndex
+from chunking import chunk_page_text_gpt2
+from embeddings_index import EmbeddingsIndex, configure_threads, embedding_cache_path
 from genai_client import create_client, ask_gemini
 
 FAISS_PATH = "rag.index"
-PASSAGES_PATH = "passages.json"
+PASSAGES_PATH = "passages.feather"
+# passages file written before the switch to Feather; still read if no .feather exists
+LEGACY_PASSAGES_PATH = "passages.json"
+
+def ocr_images(imgs) -> List[str]:
+    """
+    OCR a list of PIL images, spreading pages over worker processes.
+    Tesseract + PIL preprocessing is CPU-bound so this scales with cores.
+    """
+    if not imgs:
+        return []
+    if len(imgs) == 1:
+        return [image_to_text(imgs[0])]
+    with ProcessPoolExecutor(max_workers=min(len(imgs), os.cpu_count() or 1)) as ex:
+        return list(ex.map(image_to_text, imgs))
+
+def _ingest_one(name: str, src, use_selectable_text, max_tokens_per_chunk, overlap_tokens):
+    """
+    Chunk one document. src is a path for ingest_files, or PDF bytes / an image
+    file object for ingest_streams.
+    """
+    chunks_meta = []
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".pdf":
+        pages = pdf_pages_text(src, use_selectable_first=use_selectable_text)
+        # pages is list of (page_no, text) where text may be empty if non-selectable
+        # if empty, convert that page to image and OCR it
+        ocr_page_nos = [page_no for page_no, txt in pages if not (txt and txt.strip())]
+        ocr_texts = {}
+        if ocr_page_nos:
+            # render only the pages that need OCR, then OCR them in parallel
+            imgs = pdf_render_pages(src, ocr_page_nos, dpi=OCR_DPI)
+            ocr_texts = dict(zip(ocr_page_nos, ocr_images(imgs)))
+        for page_no, txt in pages:
+            if page_no in ocr_texts:
+                txt = ocr_texts[page_no]
+            meta = chunk_page_text_gpt2(txt, source=name, page_no=page_no,
+                                        max_tokens=max_tokens_per_chunk, overlap_tokens=overlap_tokens)
+            chunks_meta.extend(meta)
+    else:
+        # treat as image
+        from PIL import Image
+        img = Image.open(src)
+        txt = image_to_text(img)
+        meta = chunk_page_text_gpt2(txt, source=name, page_no=1,
+                                    max_tokens=max_tokens_per_chunk, overlap_tokens=overlap_tokens)
+        chunks_meta.extend(meta)
+    return chunks_meta
 
 def ingest_files(paths: List[str], use_selectable_text=True, max_tokens_per_chunk=800, overlap_tokens=150):
     chunks_meta = []
@@ -20,48 +68,40 @@ def ingest_files(paths: List[str], use_selectable_text=True, max_tokens_per_chun
             print(f"[WARN] {p} not found, skipping.")
             continue
         name = os.path.basename(p)
+        chunks_meta.extend(_ingest_one(name, p, use_selectable_text, max_tokens_per_chunk, overlap_tokens))
+    return chunks_meta
+
+def ingest_streams(streams: List[Tuple[str, BinaryIO]], use_selectable_text=True,
+                   max_tokens_per_chunk=800, overlap_tokens=150):
+    """
+    Same as ingest_files, for in-memory (name, file object) pairs such as Streamlit uploads,
+    so nothing has to be written to disk first. The name's extension picks PDF vs image.
+    """
+    chunks_meta = []
+    for name, stream in streams:
+        stream.seek(0)
         ext = os.path.splitext(name)[1].lower()
-        if ext == ".pdf":
-            pages = pdf_pages_text(p, use_selectable_first=use_selectable_text)
-            # pages is list of (page_no, text) where text may be empty if non-selectable
-            # if empty, convert that page to image and OCR it
-            images = None
-            for page_no, txt in pages:
-                if txt and txt.strip():
-                    meta = chunk_page_text(txt, source=name, page_no=page_no,
-                                           max_tokens=max_tokens_per_chunk, overlap_tokens=overlap_tokens)
-                    chunks_meta.extend(meta)
-                else:
-                    # lazily convert PDF to images once if needed
-                    if images is None:
-                        images = pdf_to_images(p)
-                    img = images[page_no - 1]
-                    ocr_text = image_to_text(img)
-                    meta = chunk_page_text(ocr_text, source=name, page_no=page_no,
-                                           max_tokens=max_tokens_per_chunk, overlap_tokens=overlap_tokens)
-                    chunks_meta.extend(meta)
-        else:
-            # treat as image
-            from PIL import Image
-            img = Image.open(p)
-            txt = image_to_text(img)
-            meta = chunk_page_text(txt, source=name, page_no=1,
-                                   max_tokens=max_tokens_per_chunk, overlap_tokens=overlap_tokens)
-            chunks_meta.extend(meta)
+        src = stream.read() if ext == ".pdf" else stream
+        chunks_meta.extend(_ingest_one(name, src, use_selectable_text, max_tokens_per_chunk, overlap_tokens))
     return chunks_meta
 
-def build_index_from_chunks(chunks_meta):
+def build_index_from_chunks(chunks_meta, emb: EmbeddingsIndex = None, index_key: str = None):
     passages = [c["label"] for c in chunks_meta]
-    emb = EmbeddingsIndex()
+    if emb is None:
+        # content-addressed {passage hash: vector} sidecar; rebuilds only encode passages not in it
+        emb = EmbeddingsIndex(cache_path=embedding_cache_path(PASSAGES_PATH))
     print(f"[INFO] Building embeddings for {len(passages)} passages...")
-    emb.build(passages)
+    emb.build(passages, index_key=index_key)
     emb.save(FAISS_PATH, PASSAGES_PATH)
     print(f"[INFO] Saved index to {FAISS_PATH} and passages to {PASSAGES_PATH}")
     return emb
 
 def load_index():
     emb = EmbeddingsIndex()
-    emb.load(FAISS_PATH, PASSAGES_PATH)
+    passages_path = PASSAGES_PATH
+    if not os.path.exists(passages_path) and os.path.exists(LEGACY_PASSAGES_PATH):
+        passages_path = LEGACY_PASSAGES_PATH
+    emb.load(FAISS_PATH, passages_path)
     print("[INFO] Loaded index.")
     return emb
 
@@ -95,6 +135,7 @@ def main():
     query = sub.add_parser("query")
     args = parser.parse_args()
 
+    configure_threads()
     client = create_client()
 
     if args.cmd == "build":
@@ -1,5 +1,6 @@
 # chunking.py
 import re
+from functools import lru_cache
 from typing import List, Tuple, Dict
 try:
     import tiktoken
@@ -7,29 +8,70 @@ try:
 except Exception:
     TIKTOKEN_AVAILABLE = False
 
-_SENT_SPLIT_RE = re.compile(r'(?<=[\.\?\!])\s+')
+_SENT_SPLIT_RE = re.compile(r'(?<=[\.\?\!])\s+', re.ASCII)
+
+@lru_cache(maxsize=4)
+def _get_encoder(encoder_name: str):
+    # loading the BPE tables is expensive; do it once per encoder name
+    return tiktoken.get_encoding(encoder_name)
+
+def _encoder_or_none(encoder_name: str):
+    return _get_encoder(encoder_name) if TIKTOKEN_AVAILABLE else None
 
 def split_into_sentences(text: str) -> List[str]:
     text = text.strip()
     if not text:
         return []
-    sentences = _SENT_SPLIT_RE.split(text)
-    return [s.strip() for s in sentences if s.strip()]
+    sentences = []
+    last = 0
+    for m in _SENT_SPLIT_RE.finditer(text):
+        # the separator swallows the whitespace run, so strip() is normally a no-copy no-op
+        s = text[last:m.start()].strip()
+        if s:
+            sentences.append(s)
+        last = m.end()
+    s = text[last:].strip()
+    if s:
+        sentences.append(s)
+    return sentences
 
 def tokens_length(text: str, encoder_name: str = "gpt2") -> int:
     if TIKTOKEN_AVAILABLE:
-        enc = tiktoken.get_encoding(encoder_name)
+        enc = _get_encoder(encoder_name)
         return len(enc.encode(text))
     # fallback heuristic
     words = text.split()
     return max(1, int(len(words) * 1.3))
 
+def _token_counts(texts: List[str], enc) -> List[int]:
+    # token counts for many strings at once (single tiktoken batch call)
+    if not texts:
+        return []
+    if enc is not None:
+        return [len(ids) for ids in enc.encode_ordinary_batch(texts)]
+    # fallback heuristic
+    return [max(1, int(len(t.split()) * 1.3)) for t in texts]
+
+def _overlap_tails(chunks: List[str], overlap_tokens: int, enc) -> List[str]:
+    # text of the last `overlap_tokens` tokens of each chunk
+    if enc is not None:
+        # a cut can land inside a multi-byte character; drop the replacement char
+        return [enc.decode(ids[-overlap_tokens:]).lstrip("\ufffd").strip()
+                for ids in enc.encode_ordinary_batch(chunks)]
+    # fallback heuristic
+    approx_words = max(1, int(overlap_tokens / 1.3))
+    return [" ".join(c.split()[-approx_words:]) for c in chunks]
+
 def chunk_sentences_to_chunks(
     sentences: List[str],
     max_tokens: int = 800,
     overlap_tokens: int = 150,
     encoder_name: str = "gpt2"
 ) -> List[str]:
+    return _chunk_sentences(sentences, max_tokens, overlap_tokens, _encoder_or_none(encoder_name))
+
+def _chunk_sentences(sentences: List[str], max_tokens: int, overlap_tokens: int, enc) -> List[str]:
+    # enc is a tiktoken Encoding, or None to use the word-count heuristic
     if not sentences:
         return []
     chunks = []
@@ -43,15 +85,15 @@ def chunk_sentences_to_chunks(
         cur = []
         cur_tokens = 0
 
-    for sent in sentences:
-        sent_tokens = tokens_length(sent, encoder_name)
+    sent_tok_counts = _token_counts(sentences, enc)
+    for sent, sent_tokens in zip(sentences, sent_tok_counts):
         if sent_tokens > max_tokens:
             # split long sentence by words into smaller pieces
             words = sent.split()
+            word_tok_counts = _token_counts([w + " " for w in words], enc)
             piece = []
             piece_tokens = 0
-            for w in words:
-                w_tokens = tokens_length(w + " ", encoder_name)
+            for w, w_tokens in zip(words, word_tok_counts):
                 if piece_tokens + w_tokens > max_tokens:
                     chunks.append(" ".join(piece).strip())
                     piece = [w]
@@ -80,16 +122,13 @@ def chunk_sentences_to_chunks(
     if cur:
         chunks.append(" ".join(cur).strip())
 
-    # Create overlap (approx): prepend last N words from previous chunk to current
+    # Create overlap: prepend last N tokens from previous chunk to current
+    # (tails come from the original chunks, so the overlap never re-splits a growing prefix)
     if overlap_tokens > 0 and len(chunks) > 1:
+        tails = _overlap_tails(chunks[:-1], overlap_tokens, enc)
         overlapped = [chunks[0]]
         for i in range(1, len(chunks)):
-            prev = overlapped[-1]
-            prev_words = prev.split()
-            approx_words = max(1, int(overlap_tokens / 1.3))
-            overlap_words = prev_words[-approx_words:] if len(prev_words) >= approx_words else prev_words
-            new_chunk = " ".join(overlap_words + chunks[i].split())
-            overlapped.append(new_chunk)
+            overlapped.append(tails[i - 1] + " " + chunks[i])
         chunks = overlapped
 
     return chunks
@@ -103,6 +142,19 @@ def chunk_page_text(page_text: str, source: str, page_no: int,
     """
     sentences = split_into_sentences(page_text)
     chunks = chunk_sentences_to_chunks(sentences, max_tokens, overlap_tokens, encoder_name)
+    return _chunk_records(chunks, source, page_no)
+
+def chunk_page_text_gpt2(page_text: str, source: str, page_no: int,
+                         max_tokens: int = 800, overlap_tokens: int = 150) -> List[Dict]:
+    """
+    chunk_page_text specialized for the gpt2 encoder (the one ingest uses).
+    The encoding is loaded on first use (tiktoken may download it), then served from the lru_cache.
+    """
+    sentences = split_into_sentences(page_text)
+    chunks = _chunk_sentences(sentences, max_tokens, overlap_tokens, _encoder_or_none("gpt2"))
+    return _chunk_records(chunks, source, page_no)
+
+def _chunk_records(chunks: List[str], source: str, page_no: int) -> List[Dict]:
     results = []
     for i, c in enumerate(chunks, start=1):
         label = f"(source:{source} page:{page_no} chunk:{i})\n{c}"
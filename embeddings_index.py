@@ -1,52 +1,508 @@
 # embeddings_index.py
 import os
 import json
-from typing import List, Dict
+import hashlib
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence
+import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
+import torch
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except Exception:
+    XXHASH_AVAILABLE = False
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
 
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
 EMBED_BATCH_SIZE = 64
+GPU_EMBED_BATCH_SIZE = 256
+# on CPU, encode at least this many passages with a pool of worker processes
+# (below it the pool start-up costs more than it saves)
+MULTI_PROCESS_MIN_PASSAGES = 2000
+# worker processes in that pool; the cores are split evenly between their torch thread pools
+MAX_ENCODE_WORKERS = 4
+# embedding cache size cap (~300 MB of float32 at 384 dims); the oldest entries are dropped first
+EMBED_CACHE_MAX_ENTRIES = 200_000
+# single-process encoding writes this many batches at a time into a preallocated matrix
+ENCODE_CHUNK_BATCHES = 16
+
+# stored vectors are only reused (instead of re-encoding) if a sample of this many
+# matches the current embedder to at least this cosine similarity
+REUSE_CHECK_SAMPLE = 32
+REUSE_MIN_COSINE = 0.99
+
+# index type by corpus size (all int8/PQ-compressed, inner product on normalized vectors):
+# brute force below FLAT_MAX_PASSAGES, HNSW graph below HNSW_MAX_PASSAGES, IVF-PQ above
+# (with a GPU, exact Flat / IVF,SQ8 below HNSW_MAX_PASSAGES instead; see default_index_key)
+FLAT_MAX_PASSAGES = 10_000
+HNSW_MAX_PASSAGES = 500_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 4096
+IVF_NPROBE = 32
+IVF_TRAIN_MAX = IVF_NLIST * 256  # training on more points than this barely moves the centroids
+
+def default_index_key(n_passages: int, gpu: bool = False) -> str:
+    """
+    faiss.index_factory string used by build() when no index_key is given.
+    With gpu=True only types faiss can clone to the GPU are picked: the flat SQ8 and
+    HNSW indexes are replaced by exact Flat and an IVF,SQ8 with ~sqrt(n) lists.
+    """
+    if gpu and n_passages < HNSW_MAX_PASSAGES:
+        if n_passages < FLAT_MAX_PASSAGES:
+            return "Flat"
+        return f"IVF{int(np.sqrt(n_passages))},SQ8"
+    if n_passages < FLAT_MAX_PASSAGES:
+        return "SQ8"
+    if n_passages < HNSW_MAX_PASSAGES:
+        return f"HNSW{HNSW_M},SQ8"
+    return f"IVF{IVF_NLIST},PQ32"
+
+def _gpu_clonable(index) -> bool:
+    # faiss's GPU cloner has no implementation for these (HNSW, flat IndexScalarQuantizer)
+    return not isinstance(faiss.downcast_index(index), (faiss.IndexHNSW, faiss.IndexScalarQuantizer))
+
+def _extract_ivf(index):
+    try:
+        return faiss.try_extract_index_ivf(index)
+    except Exception:
+        return None
+
+# autocast dtypes accepted by build(precision=...) on CUDA
+AUTOCAST_DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
+
+# passages files ending in one of these are stored as Arrow/Feather, anything else as JSON
+ARROW_EXTENSIONS = (".feather", ".arrow")
+
+def _is_arrow_path(path: str) -> bool:
+    return path.lower().endswith(ARROW_EXTENSIONS)
+
+class MappedPassages(Sequence):
+    """
+    Read-only list of passages backed by a memory-mapped Arrow column.
+    Strings are only decoded when accessed, so RSS does not grow with corpus size.
+    """
+    def __init__(self, column):
+        self.column = column
+
+    def __len__(self):
+        return len(self.column)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.column[i].to_pylist()
+        return self.column[i].as_py()
+
+    def __iter__(self):
+        for chunk in self.column.chunks:
+            yield from chunk.to_pylist()
+
+def _replace_file(tmp_path: str, path: str):
+    # rename over the target so a memory-mapped copy of the old file stays valid
+    os.replace(tmp_path, path)
+
+def _passages_table(passages: Sequence[str]):
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow not installed. pip install pyarrow or use a .json passages file.")
+    if isinstance(passages, MappedPassages):
+        return pa.table({"p": passages.column})
+    return pa.table({"p": pa.array(passages, type=pa.string())})
+
+def passages_to_bytes(passages: Sequence[str], passages_name: str) -> bytes:
+    """
+    Serialize passages in the format implied by passages_name, without touching disk.
+    """
+    if _is_arrow_path(passages_name):
+        sink = pa.BufferOutputStream()
+        feather.write_feather(_passages_table(passages), sink, compression="uncompressed")
+        return sink.getvalue().to_pybytes()
+    return json.dumps(list(passages), ensure_ascii=False).encode("utf-8")
+
+def passages_from_bytes(data: bytes, passages_name: str) -> Sequence[str]:
+    """
+    Inverse of passages_to_bytes. Arrow data is wrapped zero-copy in MappedPassages.
+    """
+    if _is_arrow_path(passages_name):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow not installed. pip install pyarrow or use a .json passages file.")
+        return MappedPassages(feather.read_table(pa.BufferReader(data)).column("p"))
+    return json.loads(data)
+
+def write_passages(passages: Sequence[str], passages_path: str):
+    tmp_path = passages_path + ".tmp"
+    if _is_arrow_path(passages_path):
+        # uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(_passages_table(passages), tmp_path, compression="uncompressed")
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(passages), f, ensure_ascii=False)
+    _replace_file(tmp_path, passages_path)
+
+def read_passages(passages_path: str, mmap: bool = False) -> Sequence[str]:
+    if _is_arrow_path(passages_path):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow not installed. pip install pyarrow or use a .json passages file.")
+        column = feather.read_table(passages_path, memory_map=mmap).column("p")
+        return MappedPassages(column) if mmap else column.to_pylist()
+    with open(passages_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def passage_key(passage: str) -> str:
+    """
+    Content hash used to key cached embeddings.
+    """
+    data = passage.encode("utf-8")
+    if XXHASH_AVAILABLE:
+        # xxhash 4.x only accepts bytes
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def embedding_cache_path(passages_path: str) -> str:
+    """
+    Sidecar cache file kept next to a passages file: passages.feather -> passages.vec.npz.
+    """
+    return os.path.splitext(passages_path)[0] + ".vec.npz"
+
+def load_embedding_cache(cache_path: str, model_name: str) -> Dict[str, np.ndarray]:
+    """
+    Returns {passage_key: vector} from a cache.npz, or {} if missing / unreadable / built with another model.
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if str(data["model"]) != model_name:
+                return {}
+            return dict(zip(data["keys"].tolist(), data["vectors"]))
+    except Exception as e:
+        # a damaged cache only costs a re-encode; the next save replaces it
+        print(f"[WARN] Ignoring unreadable embedding cache {cache_path}: {e}")
+        return {}
+
+def save_embedding_cache(cache: Dict[str, np.ndarray], cache_path: str, model_name: str,
+                         max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+    """
+    Write the cache atomically, keeping only the max_entries most recently inserted vectors.
+    """
+    items = list(cache.items())[-max_entries:]
+    tmp_path = cache_path + ".tmp"
+    # through a file object so numpy does not append its own .npz suffix to the temp name
+    with open(tmp_path, "wb") as f:
+        np.savez(f, model=np.array(model_name), keys=np.array([k for k, _ in items]),
+                 vectors=np.stack([v for _, v in items]).astype("float32", copy=False))
+    _replace_file(tmp_path, cache_path)
+
+def configure_threads():
+    """
+    Thread policy for the entry points (CLI and Streamlit app), applied once at start-up:
+    FAISS's OpenMP pool gets every logical core, torch half of them, so the two pools
+    don't oversubscribe the CPU (cpu_count also counts SMT siblings).
+    """
+    n = os.cpu_count() or 1
+    faiss.omp_set_num_threads(n)
+    torch.set_num_threads(max(1, n // 2))
+
+def num_gpus() -> int:
+    # faiss-cpu builds have no GPU support at all
+    get_num_gpus = getattr(faiss, "get_num_gpus", None)
+    return get_num_gpus() if get_num_gpus else 0
+
+@lru_cache(maxsize=1)
+def _gpu_resources():
+    # one set of scratch/stream resources per process, shared by all indexes
+    return faiss.StandardGpuResources()
+
+def load_embedder(model_name: str = DEFAULT_MODEL_NAME) -> SentenceTransformer:
+    """
+    Load the SentenceTransformer in inference mode, on CUDA in fp16 when available.
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    embedder = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        # fp16 weights: tensor-core matmuls at half the memory traffic
+        embedder.half()
+    embedder.eval()
+    return embedder
+
+def _read_index_mmap(index_path: str):
+    """
+    Read an index with as much of it memory-mapped as this faiss build allows; None if nothing works.
+    IO_FLAG_MMAP_IFC (newer faiss) maps the flat/SQ codes behind SQ8 and HNSW32,SQ8 (the HNSW graph
+    itself is still read into RAM), but combined with IO_FLAG_MMAP it raises for IVF indexes;
+    IO_FLAG_MMAP alone maps IVF inverted lists and reads every other type fully into RAM.
+    """
+    attempts = [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY]
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        attempts.insert(0, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    error = None
+    for flags in attempts:
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError as e:
+            error = e
+    print(f"[WARN] Could not memory-map index, reading into memory: {error}")
+    return None
 
 class EmbeddingsIndex:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, cache_path: Optional[str] = None,
+                 embedder: Optional[SentenceTransformer] = None):
         self.model_name = model_name
-        self.embedder = SentenceTransformer(model_name)
+        # optional .npz of {passage hash: vector}; build() only encodes passages not in it
+        self.cache_path = cache_path
+        # pass an already-loaded model to share it between indexes
+        self.embedder = embedder if embedder is not None else load_embedder(model_name)
+        self.device = self.embedder.device.type
+        self.batch_size = GPU_EMBED_BATCH_SIZE if self.device == "cuda" else EMBED_BATCH_SIZE
         self.index = None
-        self.passages: List[str] = []
+        self.on_gpu = False
+        self.passages: Sequence[str] = []
         self.dim = self.embedder.get_sentence_embedding_dimension()
 
-    def build(self, passages: List[str]):
+    def build(self, passages: List[str], batch_size: Optional[int] = None, precision: Optional[str] = None,
+              index_key: Optional[str] = None):
+        """
+        Encode passages and build the index.
+        batch_size overrides the device default; precision ("fp16"/"bf16") runs the
+        encoder under torch.autocast on CUDA and is ignored on CPU.
+        index_key is a faiss.index_factory string; default_index_key() picks one by size.
+        """
+        if not passages:
+            raise ValueError("No passages to index.")
+        if precision is not None and precision != "fp32" and precision not in AUTOCAST_DTYPES:
+            raise ValueError(f"Unsupported precision: {precision}")
+        self.passages = passages
+        self._index_vectors(self._embed_passages(passages, batch_size=batch_size, precision=precision),
+                            index_key=index_key)
+
+    def build_from_vectors(self, passages: List[str], vectors: np.ndarray, index_key: Optional[str] = None):
+        """
+        Build the index from already-computed (L2-normalized) vectors, one row per passage.
+        """
         if not passages:
             raise ValueError("No passages to index.")
+        if len(passages) != len(vectors):
+            raise ValueError(f"Got {len(passages)} passages but {len(vectors)} vectors.")
         self.passages = passages
-        vectors = self.embedder.encode(passages, show_progress_bar=True, convert_to_numpy=True, batch_size=EMBED_BATCH_SIZE)
-        faiss.normalize_L2(vectors)
-        self.index = faiss.IndexFlatIP(self.dim)
+        self._index_vectors(np.ascontiguousarray(vectors, dtype="float32"), index_key=index_key)
+
+    def vectors(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the stored vectors as an (ntotal, dim) float32 matrix (dequantized for int8 indexes),
+        or only the rows in `ids` if given.
+        """
+        if self.index is None:
+            raise RuntimeError("Index not built/loaded.")
+        ivf = _extract_ivf(self.index)
+        if ivf is not None:
+            # IVF lists are not addressable by id until a direct map exists
+            ivf.make_direct_map()
+        if ids is not None:
+            return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    def has_reusable_vectors(self, sample_size: int = REUSE_CHECK_SAMPLE) -> bool:
+        """
+        True if vectors() can stand in for re-encoding the passages: the index must support
+        reconstruct, and a sample of its vectors must match this embedder's output for the same
+        passages. That rejects indexes built with another model of the same dimension, and lossy
+        codes (e.g. PQ) that would lose more precision every time they are requantized.
+        """
+        if self.index is None or self.index.d != self.dim:
+            return False
+        n = min(self.index.ntotal, len(self.passages))
+        if n == 0:
+            return False
+        ids = np.unique(np.linspace(0, n - 1, min(sample_size, n)).astype(np.int64))
+        try:
+            stored = self.vectors(ids)
+        except RuntimeError:
+            return False
+        with torch.inference_mode():
+            fresh = self.embedder.encode([self.passages[int(i)] for i in ids], batch_size=len(ids),
+                                         convert_to_numpy=True, normalize_embeddings=True)
+        cos = np.sum(stored * fresh, axis=1) / np.maximum(np.linalg.norm(stored, axis=1), 1e-12)
+        return bool(cos.min() >= REUSE_MIN_COSINE)
+
+    def _index_vectors(self, vectors: np.ndarray, index_key: Optional[str] = None):
+        # vectors are L2-normalized, so inner product == cosine similarity;
+        # CPU defaults store int8 codes (4x smaller than fp32, negligible recall loss at this dim)
+        index_key = index_key or default_index_key(len(vectors), gpu=num_gpus() > 0)
+        self.index = faiss.index_factory(self.dim, index_key, faiss.METRIC_INNER_PRODUCT)
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if not self.index.is_trained:
+            train = vectors
+            if len(vectors) > IVF_TRAIN_MAX:
+                rows = np.random.default_rng(0).choice(len(vectors), IVF_TRAIN_MAX, replace=False)
+                train = vectors[np.sort(rows)]
+            self.index.train(train)
         self.index.add(vectors)
+        self.on_gpu = False
+        self._move_to_gpu()
+
+    def _move_to_gpu(self):
+        """
+        Copy the index onto the GPU(s) when faiss has GPU support; types without
+        a GPU implementation (e.g. HNSW, SQ8) quietly stay on the CPU.
+        """
+        n = num_gpus()
+        if n == 0 or self.on_gpu or not _gpu_clonable(self.index):
+            return
+        try:
+            if n > 1:
+                self.index = faiss.index_cpu_to_all_gpus(self.index)
+            else:
+                self.index = faiss.index_cpu_to_gpu(_gpu_resources(), 0, self.index)
+            self.on_gpu = True
+        except RuntimeError as e:
+            print(f"[WARN] Keeping FAISS index on CPU: {e}")
+
+    def cpu_index(self):
+        """
+        Returns a CPU copy of the index (the index itself if it is not on the GPU), e.g. for writing.
+        """
+        if self.index is None:
+            raise RuntimeError("Index not built/loaded.")
+        return faiss.index_gpu_to_cpu(self.index) if self.on_gpu else self.index
+
+    def _encode(self, texts: List[str], batch_size: Optional[int] = None, precision: Optional[str] = None) -> np.ndarray:
+        batch_size = batch_size or self.batch_size
+        n_workers = min(MAX_ENCODE_WORKERS, os.cpu_count() or 1)
+        if self.device == "cpu" and len(texts) >= MULTI_PROCESS_MIN_PASSAGES and n_workers > 1:
+            pool = self._start_cpu_pool(n_workers)
+            try:
+                vectors = self.embedder.encode_multi_process(texts, pool, batch_size=batch_size,
+                                                             normalize_embeddings=True)
+            finally:
+                self.embedder.stop_multi_process_pool(pool)
+            return vectors.astype("float32", copy=False)
+        autocast_dtype = AUTOCAST_DTYPES.get(precision) if self.device == "cuda" else None
+        # encode in slices straight into the output so there is never a second full-size copy;
+        # FAISS only takes float32, so fp16 output is upcast by the slice assignment
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        step = batch_size * ENCODE_CHUNK_BATCHES
+        with torch.inference_mode(), torch.autocast(device_type=self.device, dtype=autocast_dtype,
+                                                    enabled=autocast_dtype is not None):
+            for i in range(0, len(texts), step):
+                vectors[i:i + step] = self.embedder.encode(texts[i:i + step], show_progress_bar=False,
+                                                           convert_to_numpy=True, batch_size=batch_size,
+                                                           normalize_embeddings=True)
+        return vectors
+
+    def _start_cpu_pool(self, n_workers: int):
+        # workers are spawned fresh and size their torch pool from OMP_NUM_THREADS, which is
+        # read at start-up; give each its share of the cores instead of all of them
+        prev = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // n_workers))
+        try:
+            return self.embedder.start_multi_process_pool(target_devices=["cpu"] * n_workers)
+        finally:
+            if prev is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = prev
+
+    def _embed_passages(self, passages: List[str], batch_size: Optional[int] = None,
+                        precision: Optional[str] = None) -> np.ndarray:
+        if not self.cache_path:
+            return self._encode(passages, batch_size=batch_size, precision=precision)
+        cache = load_embedding_cache(self.cache_path, self.model_name)
+        keys = [passage_key(p) for p in passages]
+        misses = {}
+        for k, p in zip(keys, passages):
+            if k not in cache and k not in misses:
+                misses[k] = p
+        if misses:
+            print(f"[INFO] Encoding {len(misses)} new passages ({len(passages) - len(misses)} cached).")
+            for k, v in zip(misses.keys(), self._encode(list(misses.values()), batch_size=batch_size, precision=precision)):
+                cache[k] = v
+            # move this corpus's hits to the end so the size cap evicts passages not used recently
+            for k in dict.fromkeys(keys):
+                if k not in misses:
+                    cache[k] = cache.pop(k)
+            save_embedding_cache(cache, self.cache_path, self.model_name)
+        vectors = np.empty((len(keys), self.dim), dtype=np.float32)
+        for i, k in enumerate(keys):
+            vectors[i] = cache[k]
+        return vectors
+
+    def index_bytes(self) -> bytes:
+        """
+        Returns the index serialized exactly as save() would write it.
+        """
+        return faiss.serialize_index(self.cpu_index()).tobytes()
 
     def save(self, index_path: str, passages_path: str):
         if self.index is None:
             raise RuntimeError("Index not built.")
-        faiss.write_index(self.index, index_path)
-        with open(passages_path, "w", encoding="utf-8") as f:
-            json.dump(self.passages, f, ensure_ascii=False, indent=2)
+        tmp_path = index_path + ".tmp"
+        faiss.write_index(self.cpu_index(), tmp_path)
+        _replace_file(tmp_path, index_path)
+        write_passages(self.passages, passages_path)
 
-    def load(self, index_path: str, passages_path: str):
+    def load(self, index_path: str, passages_path: str, mmap: bool = True):
+        """
+        Load an index saved by save(). With mmap=True Arrow passages are memory-mapped read-only,
+        as are IVF inverted lists and (on faiss builds with IO_FLAG_MMAP_IFC) flat/SQ codes;
+        any other index data is still read into RAM.
+        """
         if not os.path.exists(index_path) or not os.path.exists(passages_path):
             raise FileNotFoundError("Index or passages file not found.")
-        self.index = faiss.read_index(index_path)
-        with open(passages_path, "r", encoding="utf-8") as f:
-            self.passages = json.load(f)
+        self.index = _read_index_mmap(index_path) if mmap else None
+        if self.index is None:
+            self.index = faiss.read_index(index_path)
+        self.on_gpu = False
+        self._move_to_gpu()
+        self.passages = read_passages(passages_path, mmap=mmap)
+
+    def load_bytes(self, index_bytes: bytes, passages_bytes: bytes, passages_name: str):
+        """
+        Load from in-memory serialized index + passages (e.g. members read from an uploaded zip).
+        """
+        self.index = faiss.deserialize_index(np.frombuffer(index_bytes, dtype=np.uint8))
+        self.on_gpu = False
+        self._move_to_gpu()
+        self.passages = passages_from_bytes(passages_bytes, passages_name)
 
     def query(self, q: str, top_k: int = 4):
+        return self.query_batch([q], top_k=top_k)[0]
+
+    def query_batch(self, qs: List[str], top_k: int = 4) -> List[List[Dict]]:
+        """
+        Encode all questions in one call and run a single FAISS search over the (n, dim) matrix
+        (a batched search is multi-threaded; one-vector searches are not).
+        Returns one result list per question, in order.
+        """
         if self.index is None:
             raise RuntimeError("Index not built/loaded.")
-        q_vec = self.embedder.encode([q], convert_to_numpy=True)
-        faiss.normalize_L2(q_vec)
-        D, I = self.index.search(q_vec, top_k)
-        results = []
-        for idx, score in zip(I[0].tolist(), D[0].tolist()):
-            if idx < 0 or idx >= len(self.passages):
-                continue
-            results.append({"id": idx, "score": float(score), "passage": self.passages[idx]})
-        return results
+        if not qs:
+            return []
+        with torch.inference_mode():
+            q_vecs = self.embedder.encode(qs, batch_size=len(qs), convert_to_numpy=True, normalize_embeddings=True)
+        q_vecs = q_vecs.astype("float32", copy=False)
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = HNSW_EF_SEARCH
+        ivf = _extract_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = IVF_NPROBE
+        elif hasattr(self.index, "nprobe"):
+            # GPU IVF indexes expose nprobe directly
+            self.index.nprobe = IVF_NPROBE
+        D, I = self.index.search(q_vecs, top_k)
+        all_results = []
+        for ids, scores in zip(I.tolist(), D.tolist()):
+            results = []
+            for idx, score in zip(ids, scores):
+                if idx < 0 or idx >= len(self.passages):
+                    continue
+                results.append({"id": idx, "score": float(score), "passage": self.passages[idx]})
+            all_results.append(results)
+        return all_results
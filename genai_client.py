@@ -1,6 +1,8 @@
 # genai_client.py
 import os
+import asyncio
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 
 # Load .env file from project root (or current working directory)
@@ -30,8 +32,7 @@ def create_client(api_key: str | None = None):
         )
     return genai.Client(api_key=key)
 
-def compose_prompt_with_context(question: str, passages: list):
-    system_prompt = (
+_SYSTEM_PROMPT = (
     "You are a data extraction assistant specialized in bank statements. "
     "TASK: Extract all key transaction and summary fields into a structured JSON object, "
     "and generate short financial insights based on the extracted data. "
@@ -99,12 +100,44 @@ def compose_prompt_with_context(question: str, passages: list):
     "END OF INSTRUCTIONS. Use only the CONTEXT passages provided after these instructions to extract data and build the JSON."
 )
 
+# sent once per request as system_instruction so the server can cache the prefix
+_GENERATE_CONFIG = types.GenerateContentConfig(system_instruction=_SYSTEM_PROMPT)
+
+def compose_context_prompt(question: str, passages: list):
+    """
+    User turn only (CONTEXT + QUESTION); the instructions go in as system_instruction.
+    """
     context_text = "\n\n".join([f"[PASSAGE {i+1}]\n{p}" for i, p in enumerate(passages)])
-    user_content = f"{system_prompt}\n\nCONTEXT:\n{context_text}\n\nQUESTION: {question}\n\nAnswer:"
-    return user_content
+    return "".join(["CONTEXT:\n", context_text, "\n\nQUESTION: ", question, "\n\nAnswer:"])
+
+def compose_prompt_with_context(question: str, passages: list):
+    return "".join([_SYSTEM_PROMPT, "\n\n", compose_context_prompt(question, passages)])
+
+def _response_text(response) -> str:
+    return getattr(response, "text", None) or getattr(response, "output_text", None) or str(response)
 
 def ask_gemini(client, question: str, passages: list, model: str = GENIE_MODEL):
-    content = compose_prompt_with_context(question, passages)
-    response = client.models.generate_content(model=model, contents=content)
-    text = getattr(response, "text", None) or getattr(response, "output_text", None) or str(response)
-    return text
+    content = compose_context_prompt(question, passages)
+    response = client.models.generate_content(model=model, contents=content, config=_GENERATE_CONFIG)
+    return _response_text(response)
+
+def ask_gemini_stream(client, question: str, passages: list, model: str = GENIE_MODEL):
+    """
+    Same request as ask_gemini, but yields text chunks as the model produces them.
+    """
+    content = compose_context_prompt(question, passages)
+    for chunk in client.models.generate_content_stream(model=model, contents=content, config=_GENERATE_CONFIG):
+        text = getattr(chunk, "text", None)
+        if text:
+            yield text
+
+async def ask_gemini_async(client, question: str, passages: list, model: str = GENIE_MODEL):
+    content = compose_context_prompt(question, passages)
+    response = await client.aio.models.generate_content(model=model, contents=content, config=_GENERATE_CONFIG)
+    return _response_text(response)
+
+async def ask_gemini_batch(client, questions: list, passages: list, model: str = GENIE_MODEL):
+    """
+    Ask several questions concurrently; returns answers in the same order as `questions`.
+    """
+    return await asyncio.gather(*[ask_gemini_async(client, q, passages, model=model) for q in questions])
@@ -2,6 +2,14 @@
 from PIL import Image, ImageFilter, ImageOps
 import pytesseract
 import io
+import shlex
+import subprocess
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except Exception:
+    CV2_AVAILABLE = False
 
 # If tesseract isn't on PATH, set this before calling any function:
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -10,7 +18,18 @@ def preprocess_image_for_ocr(img: Image.Image, grayscale=True, denoise=True, enl
     """
     Basic preprocessing: grayscale, optional denoise (median filter), optional enlarge.
     Returns a PIL Image.
+    Uses OpenCV (SIMD median blur + min-max normalize) when available, PIL otherwise.
     """
+    if CV2_AVAILABLE:
+        arr = np.asarray(img.convert("L") if grayscale else img.convert("RGB"))
+        if denoise:
+            arr = cv2.medianBlur(arr, 3)
+        if enlarge:
+            h, w = arr.shape[:2]
+            arr = cv2.resize(arr, (w * 2, h * 2), interpolation=cv2.INTER_LANCZOS4)
+        # increase contrast slightly (same min-max stretch as autocontrast)
+        arr = cv2.normalize(arr, None, 0, 255, cv2.NORM_MINMAX)
+        return Image.fromarray(arr)
     if grayscale:
         img = img.convert("L")
     if denoise:
@@ -28,8 +47,24 @@ def image_to_text(img: Image.Image, config: str = "--psm 3"):
     psm options can be tuned (3 = fully automatic page segmentation).
     """
     pre = preprocess_image_for_ocr(img)
-    text = pytesseract.image_to_string(pre, config=config)
-    return text
+    try:
+        return _tesseract_stdin(pre, config)
+    except (OSError, RuntimeError):
+        # e.g. a tesseract build that can't read stdin: use pytesseract's temp-file path
+        return pytesseract.image_to_string(pre, config=config)
+
+def _tesseract_stdin(img: Image.Image, config: str = "--psm 3") -> str:
+    """
+    Pipe the image to tesseract as PGM/PPM bytes and read the text from stdout,
+    avoiding pytesseract's temp-file write + read per page.
+    """
+    buf = io.BytesIO()
+    img.save(buf, format="PPM")  # "L" images are written as PGM
+    cmd = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout"] + shlex.split(config)
+    proc = subprocess.run(cmd, input=buf.getvalue(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"tesseract failed: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout.decode("utf-8", errors="replace")
 
 def image_path_to_text(path: str, **kwargs):
     img = Image.open(path)
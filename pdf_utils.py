@@ -1,6 +1,7 @@
 # pdf_utils.py
 import os
-from typing import List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Union
 from PIL import Image
 try:
     import fitz  # PyMuPDF
@@ -9,42 +10,114 @@ except Exception:
     PYMUPDF_AVAILABLE = False
 
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, convert_from_bytes
     PDF2IMAGE_AVAILABLE = True
 except Exception:
     PDF2IMAGE_AVAILABLE = False
 
 POPPLER_PATH = None  # set to the poppler bin path on Windows if needed
 
-def pdf_selectable_text(pdf_path: str) -> List[Tuple[int, str]]:
+# resolution used when rasterizing pages for OCR; 150 dpi is enough for statement text
+# and has ~44% fewer pixels than 200 dpi
+OCR_DPI = 150
+
+# pages with less selectable text than this are treated as scanned and sent to OCR
+MIN_CHARS_PER_PAGE = 20
+
+# documents with at least this many pages have their text extracted by several processes
+PARALLEL_TEXT_MIN_PAGES = 32
+MAX_TEXT_WORKERS = 8
+
+# every pdf_path argument below also accepts the PDF's raw bytes (e.g. an in-memory upload)
+PdfSource = Union[str, bytes]
+
+def _open_pdf(pdf_path: PdfSource):
+    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf_path, filetype="pdf")
+    return fitz.open(pdf_path)
+
+if PYMUPDF_AVAILABLE:
+    # expand ligatures so garbled glyphs don't look like real text; no TEXT_DEHYPHENATE, since a
+    # trailing "-" / "Dr-" on a statement amount is a debit sign, not a line-break hyphen
+    TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+def pdf_selectable_text(pdf_path: PdfSource) -> List[Tuple[int, str]]:
     """
     Try to extract selectable text per page using PyMuPDF (fast & preferable).
     Returns list of (page_number starting at 1, text) or empty list if not available.
+    Text is "" for pages with fewer than MIN_CHARS_PER_PAGE characters (caller should OCR those).
     """
     if not PYMUPDF_AVAILABLE:
         return []
-    doc = fitz.open(pdf_path)
-    pages = []
-    for i, page in enumerate(doc, start=1):
-        text = page.get_text().strip()
-        pages.append((i, text))
-    doc.close()
-    return pages
+    doc = _open_pdf(pdf_path)
+    page_count = doc.page_count
+    workers = min(MAX_TEXT_WORKERS, os.cpu_count() or 1, page_count)
+    if page_count < PARALLEL_TEXT_MIN_PAGES or workers < 2:
+        texts = [_page_text(page) for page in doc]
+        doc.close()
+    else:
+        # MuPDF is not thread-safe, so split the page range across processes instead of threads
+        doc.close()
+        step = -(-page_count // workers)
+        ranges = [(pdf_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        with ProcessPoolExecutor(max_workers=len(ranges)) as ex:
+            texts = [t for part in ex.map(_page_range_text, ranges) for t in part]
+    return list(enumerate(texts, start=1))
+
+def _page_text(page) -> str:
+    text = page.get_text("text", flags=TEXT_FLAGS).strip()
+    if len(text) < MIN_CHARS_PER_PAGE:
+        return ""
+    return text
 
-def pdf_to_images(pdf_path: str, dpi: int = 200) -> List[Image.Image]:
+def _page_range_text(args) -> List[str]:
+    # worker for pdf_selectable_text: text of pages [start, stop) (0-based)
+    pdf_path, start, stop = args
+    doc = _open_pdf(pdf_path)
+    try:
+        return [_page_text(doc.load_page(i)) for i in range(start, stop)]
+    finally:
+        doc.close()
+
+def pdf_to_images(pdf_path: PdfSource, dpi: int = 200) -> List[Image.Image]:
     """
     Convert each PDF page to a PIL Image using pdf2image.
     Requires poppler available on the system.
     """
     if not PDF2IMAGE_AVAILABLE:
         raise RuntimeError("pdf2image not installed. pip install pdf2image and ensure poppler is available.")
+    convert = convert_from_path if isinstance(pdf_path, str) else convert_from_bytes
     if POPPLER_PATH:
-        pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=POPPLER_PATH)
+        pages = convert(pdf_path, dpi=dpi, poppler_path=POPPLER_PATH)
     else:
-        pages = convert_from_path(pdf_path, dpi=dpi)
+        pages = convert(pdf_path, dpi=dpi)
     return pages
 
-def pdf_pages_text(pdf_path: str, use_selectable_first: bool = True) -> List[Tuple[int, str]]:
+def pdf_render_page(doc, page_no: int, dpi: int = 200) -> Image.Image:
+    """
+    Render a single page (page_no starting at 1) of an open PyMuPDF document to a PIL Image.
+    """
+    zoom = dpi / 72
+    pix = doc.load_page(page_no - 1).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def pdf_render_pages(pdf_path: PdfSource, page_nos: List[int], dpi: int = 200) -> List[Image.Image]:
+    """
+    Render only the requested pages (page numbers starting at 1) to PIL Images.
+    Uses PyMuPDF when available (no poppler subprocess); otherwise falls back to pdf2image.
+    """
+    if not page_nos:
+        return []
+    if not PYMUPDF_AVAILABLE:
+        images = pdf_to_images(pdf_path, dpi=dpi)
+        return [images[n - 1] for n in page_nos]
+    doc = _open_pdf(pdf_path)
+    try:
+        return [pdf_render_page(doc, n, dpi=dpi) for n in page_nos]
+    finally:
+        doc.close()
+
+def pdf_pages_text(pdf_path: PdfSource, use_selectable_first: bool = True) -> List[Tuple[int, str]]:
     """
     Returns list of (page_number, text) for a PDF.
     Tries selectable text first (PyMuPDF). If pages lack text, falls back to OCR images (caller must OCR).
@@ -56,7 +129,13 @@ def pdf_pages_text(pdf_path: str, use_selectable_first: bool = True) -> List[Tup
             # return as-is; caller can detect empty page text and opt to OCR
             return sel
     # fallback to images (caller will OCR using ocr_utils)
-    imgs = pdf_to_images(pdf_path)
-    for i, img in enumerate(imgs, start=1):
+    if PYMUPDF_AVAILABLE:
+        # only the page count is needed here; the caller renders pages it OCRs
+        doc = _open_pdf(pdf_path)
+        page_count = doc.page_count
+        doc.close()
+    else:
+        page_count = len(pdf_to_images(pdf_path))
+    for i in range(1, page_count + 1):
         pages.append((i, ""))  # placeholder text empty -> caller should OCR
     return pages
@@ -1,16 +1,76 @@
 import os
+import hashlib
+import itertools
+import shutil
 import tempfile
+import uuid
 import zipfile
 import io
+import numpy as np
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
 from typing import List
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=".env", override=False)
 
-from app import ingest_files, build_index_from_chunks, load_index, FAISS_PATH, PASSAGES_PATH
-from genai_client import create_client, ask_gemini
-from embeddings_index import EmbeddingsIndex
+from app import ingest_streams, build_index_from_chunks, load_index, FAISS_PATH, PASSAGES_PATH
+from genai_client import create_client, ask_gemini_stream
+from embeddings_index import (EmbeddingsIndex, ARROW_EXTENSIONS, DEFAULT_MODEL_NAME, configure_threads,
+                              embedding_cache_path, load_embedder, passages_to_bytes)
+
+PASSAGES_EXTENSIONS = ARROW_EXTENSIONS + (".json",)
+
+# -------------------------
+# Heavy resources: created once per server process, reused across reruns
+# -------------------------
+# no spinner: this runs before st.set_page_config, and a spinner would be the first element
+@st.cache_resource(show_spinner=False)
+def _init_threads():
+    configure_threads()
+
+_init_threads()
+
+@st.cache_resource
+def get_genai_client():
+    return create_client()
+
+@st.cache_resource
+def get_embedder(model_name: str):
+    return load_embedder(model_name)
+
+def save_uploads(files, out_dir: str) -> List[str]:
+    """
+    Write uploaded files into out_dir concurrently; returns paths in upload order.
+    Each file gets its own numbered subdirectory, so uploads sharing a name never write the same path.
+    """
+    def _dump(i, f):
+        file_dir = os.path.join(out_dir, str(i))
+        os.makedirs(file_dir, exist_ok=True)
+        out = os.path.join(file_dir, os.path.basename(f.name))
+        # stream in 1 MiB blocks rather than materializing the whole file first
+        f.seek(0)
+        with open(out, "wb") as wf:
+            shutil.copyfileobj(f, wf, length=1 << 20)
+        return out
+    with ThreadPoolExecutor(max_workers=min(8, len(files))) as ex:
+        return list(ex.map(_dump, range(len(files)), files))
+
+def check_zip_member(info: zipfile.ZipInfo) -> str:
+    """
+    Return the member's name, raising ValueError for absolute or parent-relative paths (zip-slip).
+    """
+    parts = PurePosixPath(info.filename.replace("\\", "/")).parts
+    if info.filename.startswith(("/", "\\")) or ".." in parts or (parts and ":" in parts[0]):
+        raise ValueError(f"Unsafe path in zip: {info.filename!r}")
+    return info.filename
+
+def new_embeddings_index(passages_path: str, model_name: str = DEFAULT_MODEL_NAME) -> EmbeddingsIndex:
+    # each index owns its FAISS data; only the SentenceTransformer is shared.
+    # The embedding cache sits next to the passages file the index will be saved to.
+    return EmbeddingsIndex(model_name=model_name, cache_path=embedding_cache_path(passages_path),
+                           embedder=get_embedder(model_name))
 
 st.set_page_config(page_title="RAG OCR → Gemini", layout="wide")
 st.title("RAG: PDF/Image OCR → FAISS → Gemini")
@@ -24,6 +84,29 @@ if "emb" not in st.session_state:
     st.session_state["emb"] = None
 if "num_passages" not in st.session_state:
     st.session_state["num_passages"] = 0
+if "emb_id" not in st.session_state:
+    st.session_state["emb_id"] = None
+
+def set_current_index(emb: EmbeddingsIndex, num_passages: int):
+    st.session_state["emb"] = emb
+    st.session_state["index_built"] = True
+    st.session_state["num_passages"] = num_passages
+    # fresh id per index so cached query results never outlive the index they came from
+    st.session_state["emb_id"] = uuid.uuid4().hex
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def cached_query(index_id: str, questions: tuple, top_k: int, _emb: EmbeddingsIndex):
+    # keyed on (index_id, questions, top_k); the leading underscore keeps _emb out of the key
+    results = _emb.query_batch(list(questions), top_k=top_k)
+    # flatten, keeping only the first hit for each passage
+    seen_ids = set()
+    merged = []
+    for r in itertools.chain.from_iterable(results):
+        if r["id"] in seen_ids:
+            continue
+        seen_ids.add(r["id"])
+        merged.append(r)
+    return merged
 
 # -------------------------
 # API key check
@@ -49,43 +132,42 @@ uploaded = st.file_uploader(
 
 build_btn = st.button("Build index from uploaded files", disabled=upload_disabled)
 
-# Uploader for saved index files (.zip or .index + .json)
+# Uploader for saved index files (.zip or .index + .feather/.arrow/.json)
 uploaded_index_files = st.file_uploader(
     "Upload index (.zip) or index + passages files",
     accept_multiple_files=True,
-    type=["zip", "index", "json"],
-    help="Upload a .zip (containing .index and passages.json) or upload the .index and passages.json files together.",
+    type=["zip", "index"] + [ext.lstrip(".") for ext in PASSAGES_EXTENSIONS],
+    help="Upload a .zip (containing .index and passages.feather/.arrow/.json) or upload the .index and passages files together.",
 )
 
 upload_index_btn = st.button("Upload index files")
 
-# Sidebar options
-st.sidebar.markdown("## Index file options")
-index_filename = st.sidebar.text_input("Index filename", value=FAISS_PATH)
-passages_filename = st.sidebar.text_input("Passages filename", value=PASSAGES_PATH)
-zip_name = st.sidebar.text_input("Zip filename for download", value="rag_index.zip")
-autosave_merged = st.sidebar.checkbox("Autosave merged index", value=False)
+# Sidebar options (in a form so editing them doesn't rerun the script on every keystroke)
+with st.sidebar.form("index_opts"):
+    st.markdown("## Index file options")
+    index_filename = st.text_input("Index filename", value=FAISS_PATH)
+    passages_filename = st.text_input("Passages filename", value=PASSAGES_PATH)
+    zip_name = st.text_input("Zip filename for download", value="rag_index.zip")
+    autosave_merged = st.checkbox("Autosave merged index", value=False)
+    index_key = st.text_input(
+        "FAISS index type",
+        value="",
+        help="faiss.index_factory string (e.g. SQ8, HNSW32,SQ8, IVF4096,PQ32). Leave blank to pick by passage count.",
+    ).strip() or None
+    st.form_submit_button("Apply")
 
 # -------------------------
 # Build index from uploaded documents (PDF/image)
 # -------------------------
 if build_btn and uploaded:
-    with st.spinner("Saving uploads and building index (this may take a while)..."):
-        tmpdir = tempfile.mkdtemp(prefix="rag_upload_")
-        paths = []
-        for f in uploaded:
-            out = os.path.join(tmpdir, f.name)
-            with open(out, "wb") as wf:
-                wf.write(f.getbuffer())
-            paths.append(out)
-        chunks_meta = ingest_files(paths)
+    with st.spinner("Building index from uploads (this may take a while)..."):
+        # Uploads are already in memory; ingest them directly instead of via temp files
+        chunks_meta = ingest_streams([(f.name, f) for f in uploaded])
         if not chunks_meta:
             st.error("No text found in uploads.")
         else:
-            emb = build_index_from_chunks(chunks_meta)
-            st.session_state["index_built"] = True
-            st.session_state["emb"] = emb
-            st.session_state["num_passages"] = len(emb.passages)
+            emb = build_index_from_chunks(chunks_meta, emb=new_embeddings_index(PASSAGES_PATH), index_key=index_key)
+            set_current_index(emb, len(emb.passages))
             st.success(f"Built index with {len(emb.passages)} passages.")
 
 # -------------------------
@@ -93,43 +175,49 @@ if build_btn and uploaded:
 # -------------------------
 if upload_index_btn:
     if not uploaded_index_files:
-        st.error("No files uploaded. Please upload a .zip or both the .index and passages.json files.")
+        st.error("No files uploaded. Please upload a .zip or both the .index and passages files.")
     else:
-        tmp_dir = tempfile.mkdtemp(prefix="uploaded_index_")
-        saved_paths = []
         try:
-            # Save uploaded files to a temp directory
-            for uf in uploaded_index_files:
-                out_path = os.path.join(tmp_dir, uf.name)
-                with open(out_path, "wb") as wf:
-                    wf.write(uf.getbuffer())
-                saved_paths.append(out_path)
-
             # Detect whether zip or separate files
             index_path = None
             passages_path = None
-            if len(saved_paths) == 1 and saved_paths[0].lower().endswith(".zip"):
-                with zipfile.ZipFile(saved_paths[0], "r") as zf:
-                    zf.extractall(tmp_dir)
-                for fn in os.listdir(tmp_dir):
-                    if fn.lower().endswith(".index"):
-                        index_path = os.path.join(tmp_dir, fn)
-                    if fn.lower().endswith(".json"):
-                        passages_path = os.path.join(tmp_dir, fn)
+            zip_payload = None  # (index bytes, passages bytes, passages member name)
+            if len(uploaded_index_files) == 1 and uploaded_index_files[0].name.lower().endswith(".zip"):
+                # Read just the two members from the uploaded archive in memory; nothing is extracted
+                with zipfile.ZipFile(uploaded_index_files[0], "r") as zf:
+                    index_member = None
+                    passages_member = None
+                    for m in zf.infolist():
+                        name = check_zip_member(m).lower()
+                        # only the two expected members are ever decompressed; everything else is skipped
+                        if m.is_dir() or name.startswith("__macosx/"):
+                            continue
+                        if name.endswith(".index"):
+                            index_member = m
+                        elif name.endswith(PASSAGES_EXTENSIONS):
+                            passages_member = m
+                    if index_member and passages_member:
+                        zip_payload = (zf.read(index_member), zf.read(passages_member), passages_member.filename)
             else:
-                for p in saved_paths:
-                    if p.lower().endswith(".index"):
-                        index_path = p
-                    if p.lower().endswith(".json"):
-                        passages_path = p
-
-            if not index_path or not passages_path:
-                st.error("Could not find both index (.index) and passages (.json) files in the upload. Please upload a zip with both or upload both files.")
+                # Save uploaded files to a temp directory
+                tmp_dir = tempfile.mkdtemp(prefix="uploaded_index_")
+                for out_path in save_uploads(uploaded_index_files, tmp_dir):
+                    if out_path.lower().endswith(".index"):
+                        index_path = out_path
+                    if out_path.lower().endswith(PASSAGES_EXTENSIONS):
+                        passages_path = out_path
+
+            if zip_payload is None and (not index_path or not passages_path):
+                st.error("Could not find both index (.index) and passages (.feather/.json) files in the upload. Please upload a zip with both or upload both files.")
             else:
                 # Load uploaded index into temporary EmbeddingsIndex
-                emb_uploaded = EmbeddingsIndex()
+                emb_uploaded = new_embeddings_index(passages_filename)
                 try:
-                    emb_uploaded.load(index_path=index_path, passages_path=passages_path)
+                    if zip_payload is not None:
+                        emb_uploaded.load_bytes(*zip_payload)
+                    else:
+                        # memory-map the saved upload instead of copying it all into RAM
+                        emb_uploaded.load(index_path=index_path, passages_path=passages_path, mmap=True)
                 except Exception as e_load:
                     st.error(f"Failed to load uploaded index: {e_load}")
                     raise
@@ -145,9 +233,7 @@ if upload_index_btn:
                 if emb_existing is None or existing_count == 0:
                     # No existing index in memory (or empty) -> use uploaded as current
                     st.info("No existing in-memory index found (or it is empty). Using uploaded index as current index.")
-                    st.session_state["emb"] = emb_uploaded
-                    st.session_state["index_built"] = True
-                    st.session_state["num_passages"] = uploaded_count
+                    set_current_index(emb_uploaded, uploaded_count)
                     st.success(f"Uploaded index loaded with {uploaded_count} passages.")
                     if autosave_merged:
                         try:
@@ -157,33 +243,53 @@ if upload_index_btn:
                             st.error(f"Autosave failed: {e_save}")
                 else:
                     # Merge: combine passages (existing first), dedupe exact matches, rebuild
-                    st.info("Merging uploaded index with existing in-memory index. This will re-build the combined FAISS index (may take time).")
-
-                    combined_passages = list(emb_existing.passages) + list(emb_uploaded.passages)
+                    st.info("Merging uploaded index with existing in-memory index. This will re-build the combined FAISS index.")
 
-                    # Simple exact-text dedupe preserving order (existing-first)
-                    seen = set()
+                    # Simple exact-text dedupe preserving order (existing-first);
+                    # 16-byte digests keep the seen-set small compared to holding every passage string
+                    seen_hashes = set()
                     deduped_passages = []
-                    for p in combined_passages:
-                        if p in seen:
+                    kept_rows = []  # row in the existing index, or existing_count + row in the uploaded one
+                    for row, p in enumerate(itertools.chain(emb_existing.passages, emb_uploaded.passages)):
+                        h = hashlib.blake2b(p.encode("utf-8"), digest_size=16).digest()
+                        if h in seen_hashes:
                             continue
-                        seen.add(p)
+                        seen_hashes.add(h)
                         deduped_passages.append(p)
+                        kept_rows.append(row)
 
                     st.info(f"Combined {existing_count} + {uploaded_count} => {len(deduped_passages)} after deduplication.")
 
-                    # Rebuild embeddings + FAISS from combined deduped passages
-                    new_emb = EmbeddingsIndex(model_name=emb_existing.model_name)
+                    new_emb = new_embeddings_index(passages_filename, emb_existing.model_name)
                     try:
-                        with st.spinner("Rebuilding combined index (encoding embeddings)..."):
-                            new_emb.build(deduped_passages)
+                        reused = False
+                        if emb_existing.has_reusable_vectors() and emb_uploaded.has_reusable_vectors():
+                            # Both indexes hold (near-)exact vectors from this model: reuse them, no re-encoding
+                            try:
+                                with st.spinner("Rebuilding combined index from stored vectors..."):
+                                    # kept rows are existing-first, so the existing ones are a prefix;
+                                    # reconstruct only those rows, straight into one preallocated matrix
+                                    kept_rows = np.asarray(kept_rows, dtype=np.int64)
+                                    n_from_existing = int(np.searchsorted(kept_rows, existing_count))
+                                    xb = np.empty((len(kept_rows), new_emb.dim), dtype=np.float32)
+                                    if n_from_existing:
+                                        xb[:n_from_existing] = emb_existing.vectors(kept_rows[:n_from_existing])
+                                    if n_from_existing < len(kept_rows):
+                                        xb[n_from_existing:] = emb_uploaded.vectors(kept_rows[n_from_existing:] - existing_count)
+                                    new_emb.build_from_vectors(deduped_passages, xb, index_key=index_key)
+                                reused = True
+                            except RuntimeError as e_reuse:
+                                st.warning(f"Could not reuse stored vectors ({e_reuse}); re-encoding instead.")
+                        if not reused:
+                            # Different model, lossy (PQ) codes or no reconstruct support: re-encode
+                            # (passages already in the embedding cache get their exact vectors back)
+                            with st.spinner("Rebuilding combined index (encoding embeddings)..."):
+                                new_emb.build(deduped_passages, batch_size=256, precision="fp16", index_key=index_key)
                     except Exception as e_build:
                         st.error(f"Failed to build merged index: {e_build}")
                     else:
                         # Replace in-memory index with merged one
-                        st.session_state["emb"] = new_emb
-                        st.session_state["index_built"] = True
-                        st.session_state["num_passages"] = len(new_emb.passages)
+                        set_current_index(new_emb, len(new_emb.passages))
                         st.success(f"Merged index loaded with {len(new_emb.passages)} passages (deduplicated).")
 
                         # Autosave if requested
@@ -220,20 +326,15 @@ if st.session_state["index_built"] and st.session_state["emb"] is not None:
         if st.button("Create download ZIP"):
             try:
                 emb: EmbeddingsIndex = st.session_state["emb"]
-                save_index_path = index_filename
-                save_passages_path = passages_filename
-                try:
-                    emb.save(index_path=save_index_path, passages_path=save_passages_path)
-                except Exception:
-                    tmp_dir = tempfile.mkdtemp(prefix="rag_index_")
-                    save_index_path = os.path.join(tmp_dir, os.path.basename(index_filename))
-                    save_passages_path = os.path.join(tmp_dir, os.path.basename(passages_filename))
-                    emb.save(index_path=save_index_path, passages_path=save_passages_path)
-
+                # Serialize straight into the archive; no save-to-disk and read-back
                 zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-                    zipf.write(save_index_path, arcname=os.path.basename(save_index_path))
-                    zipf.write(save_passages_path, arcname=os.path.basename(save_passages_path))
+                # FAISS vector bytes are near-incompressible, so store them as-is; deflate only the text
+                with zipfile.ZipFile(zip_buffer, "w") as zipf:
+                    zipf.writestr(os.path.basename(index_filename), emb.index_bytes(),
+                                  compress_type=zipfile.ZIP_STORED)
+                    zipf.writestr(os.path.basename(passages_filename),
+                                  passages_to_bytes(emb.passages, passages_filename),
+                                  compress_type=zipfile.ZIP_DEFLATED, compresslevel=6)
                 zip_buffer.seek(0)
 
                 st.download_button(
@@ -248,26 +349,30 @@ if st.session_state["index_built"] and st.session_state["emb"] is not None:
 
     st.markdown("---")
     st.markdown("### Ask a question (uses the built/loaded FAISS index)")
-    question = st.text_input("Question")
+    with st.form("ask"):
+        question = st.text_area("Question", help="Ask several related questions at once by putting one per line.")
+        ask = st.form_submit_button("Ask Gemini")
     top_k = 8
-    if st.button("Ask Gemini") and question.strip():
+    questions = tuple(q.strip() for q in question.split("\n") if q.strip())
+    if ask and questions:
         try:
-            client = create_client()
+            client = get_genai_client()
         except Exception as e:
             st.error(f"GENAI client creation failed: {e}")
             client = None
 
         if client:
             emb: EmbeddingsIndex = st.session_state["emb"]
-            retrieved = emb.query(question, top_k=top_k)
+            # one batched search for all questions; contexts are merged into a single prompt
+            retrieved = cached_query(st.session_state["emb_id"], questions, top_k, emb)
             if not retrieved:
                 st.info("No relevant passages found.")
             else:
                 
                 top_texts = [r["passage"] for r in retrieved]
+                # stream the answer so the user sees the first tokens instead of waiting for the last
                 with st.spinner("Asking Gemini..."):
-                    answer = ask_gemini(client, question, top_texts)
-                st.write("### Gemini answer")
-                st.write(answer)
+                    st.write("### Gemini answer")
+                    st.write_stream(ask_gemini_stream(client, "\n".join(questions), top_texts))
 else:
     st.info("Build an index from uploads or load an existing index to start querying.")